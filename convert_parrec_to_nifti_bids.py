@@ -23,46 +23,250 @@ Usage:
     python convert_parrec_to_nifti_bids.py                    # Convert all subjects
     python convert_parrec_to_nifti_bids.py VA003             # Convert specific subject
     python convert_parrec_to_nifti_bids.py VA003 VA004       # Convert multiple subjects
+    python convert_parrec_to_nifti_bids.py --jobs 4          # Convert 4 subjects at a time
+    python convert_parrec_to_nifti_bids.py --force           # Reconvert up-to-date files too
 """
 
 import os
 import json
-import subprocess
 import re
-import xml.etree.ElementTree as ET
 import argparse
+import multiprocessing
 import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache, partial
+from types import MappingProxyType
+import numpy as np
 import nibabel as nib
+from nibabel.cmdline import parrec2nii
+from nibabel.openers import ImageOpener
 
+try:
+    # optional, faster XML parsing; also tolerates malformed and very large
+    # Philips XML files
+    from lxml import etree as ET
+    XML_PARSE_OPTIONS = {'huge_tree': True, 'recover': True}
+except ImportError:
+    import xml.etree.ElementTree as ET
+    XML_PARSE_OPTIONS = {}
 
+try:
+    import orjson  # optional, speeds up writing the JSON sidecars
+except ImportError:
+    orjson = None
+
+try:
+    from isal import igzip, isal_zlib  # optional, speeds up writing .nii.gz files
+except ImportError:
+    igzip = None
+
+
+# Default maximum number of PAR files converted concurrently within one
+# subject, also the cap on the threads writing a subject's sidecars
+MAX_PAR_WORKERS = 8
+
+# How conversion worker processes are started: forkserver where the platform
+# has it, spawn otherwise
+CONVERTER_START_METHOD = (
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+# Philips PAR filename: <patient>_<exam>_<series>_<acquisition>_<time>_(<protocol>).PAR
+PAR_FILENAME_RE = re.compile(r'(.+?)_(\d+)_(\d+)_(\d+)_(\d+\.\d+\.\d+)_\((.+?)\)\.PAR', re.ASCII)
+
+# PAR header fields, keyed by a substring that identifies the header line:
+# marker -> (metadata key, value pattern, converter). PAR files are scanned
+# as bytes, so markers and patterns are bytes too
+PAR_HEADER_FIELDS = {
+    b'Repetition time [ms]': (
+        'RepetitionTime',
+        re.compile(rb'Repetition time \[ms\]\s*:\s*([\d.]+)'),
+        lambda m: float(m.group(1)) / 1000.0  # Convert to seconds
+    ),
+    b'Echo time [ms]': (
+        'EchoTime',
+        re.compile(rb'Echo time \[ms\]\s*:\s*([\d.]+)'),
+        lambda m: float(m.group(1)) / 1000.0  # Convert to seconds
+    ),
+    b'Max. number of slices/locations': (
+        'NumberOfSlices',
+        re.compile(rb'Max\. number of slices/locations\s*:\s*(\d+)'),
+        lambda m: int(m.group(1))
+    ),
+    b'Max. number of dynamics': (
+        'NumberOfDynamics',
+        re.compile(rb'Max\. number of dynamics\s*:\s*(\d+)'),
+        lambda m: int(m.group(1))
+    ),
+    b'FOV (ap,fh,rl) [mm]': (
+        'FieldOfView',
+        re.compile(rb'FOV \(ap,fh,rl\) \[mm\]\s*:\s*([\d.]+)\s+([\d.]+)\s+([\d.]+)'),
+        lambda m: [float(m.group(1)), float(m.group(2)), float(m.group(3))]
+    ),
+    b'Scan resolution': (
+        'ScanResolution',
+        re.compile(rb'Scan resolution\s*\(x, y\)\s*:\s*(\d+)\s+(\d+)'),
+        lambda m: [int(m.group(1)), int(m.group(2))]
+    ),
+}
+
+# Characters stripped from protocol names to build BIDS acq labels
+NON_ALNUM_RE = re.compile(r'[^a-zA-Z0-9]')
+
+# Protocol name classes, in priority order: the first class whose keyword
+# occurs in the lowercased protocol name wins ('t1' also covers 't1w').
+# name -> (keyword pattern, BIDS suffix, modality, task)
+PROTOCOL_CLASSES = {
+    't1': (r't1', 'T1w', 'anat', None),
+    't2': (r't2', 'T2w', 'anat', None),
+    'rest': (r'funct|resting', 'bold', 'func', 'rest'),
+    'anticipation': (r'anticipation', 'bold', 'func', 'anticipation'),
+    'test': (r'test_epi', 'bold', 'func', 'test'),
+    'b0map': (r'b0map', 'phasediff', 'fmap', None),
+    'survey': (r'survey', 'scout', 'anat', None),
+}
+
+# Classifies a protocol name in one match() call. Each alternative is a
+# lookahead tried in priority order from the start of the string, and
+# match.lastgroup names the class that matched.
+PROTOCOL_RE = re.compile(
+    '|'.join(f'(?=.*?(?P<{name}>{keyword}))' for name, (keyword, *_) in PROTOCOL_CLASSES.items()),
+    re.DOTALL
+)
+
+# Philips XML sections to read attributes from -> metadata key prefix
+XML_SECTIONS = {
+    'Series_Info': '',
+    'Image_Info': 'Image_',
+}
+
+# proc_file() logs through verbose(), whose switch is normally set by the
+# parrec2nii command line entry point; quiet unless --verbose is given
+parrec2nii.verbose.switch = False
+
+# nibabel's default opener for .gz image files
+_nibabel_gzip_open, _gzip_open_args = ImageOpener.compress_ext_map['.gz']
+
+
+def _isal_gzip_open(filename, mode='rb', compresslevel=1, mtime=0, keep_open=False):
+    """Open .gz image files for writing with Intel ISA-L (igzip).
+
+    Reading is left to nibabel's default opener.
+    """
+    if 'w' not in mode:
+        return _nibabel_gzip_open(filename, mode, compresslevel, mtime, keep_open)
+    compresslevel = min(compresslevel, isal_zlib.ISAL_BEST_COMPRESSION)
+    # As in nibabel's DeterministicGzipFile, open the file here and pass an
+    # empty name, so the gzip header does not record the (temporary, PAR
+    # derived) file name
+    raw = open(filename, mode if 'b' in mode else mode + 'b')
+    try:
+        gz_file = igzip.IGzipFile(filename='', mode=mode, compresslevel=compresslevel,
+                                  fileobj=raw, mtime=mtime)
+    except Exception:
+        raw.close()
+        raise
+    # Closing the gzip file then closes raw as well
+    gz_file.myfileobj = raw
+    return gz_file
+
+def _gzip_header_has_name(data):
+    """Whether gzip data has the FNAME flag set in its header."""
+    return bool(data[3] & 0x08)
+
+def _isal_writes_anonymous_gzip():
+    """Check that igzip output written as above carries no file name."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'check.nii.gz')
+        with _isal_gzip_open(path, 'wb') as f:
+            f.write(b'\0')
+        with open(path, 'rb') as f:
+            return not _gzip_header_has_name(f.read(4))
+
+if igzip is not None and _isal_writes_anonymous_gzip():
+    # Compressing the image data is the largest cost of writing .nii.gz
+    # files; route nibabel's .gz writes through ISA-L when it is installed
+    ImageOpener.compress_ext_map['.gz'] = (_isal_gzip_open, _gzip_open_args)
+
+# Serializes output from the per-PAR worker threads
+_print_lock = threading.Lock()
+
+
+def _print(*args, **kwargs):
+    """Thread-safe print for use from the PAR worker threads."""
+    with _print_lock:
+        print(*args, **kwargs)
+
+def _dumps(obj):
+    """Serialize obj to indented JSON bytes, using orjson when available."""
+    if orjson is not None:
+        # Accept the same non-string keys that json.dumps converts to strings
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2).encode()
 
 def parse_xml_file(xml_file_path):
+    """Parse an XML file, reusing the result while the file is unchanged."""
+    try:
+        st = os.stat(xml_file_path)
+    except OSError as e:
+        _print(f"Warning: Could not parse XML file {xml_file_path}: {e}")
+        return MappingProxyType({})
+    return _parse_xml_file_cached(str(xml_file_path), st.st_mtime_ns, st.st_size)
+
+def _release_element(elem):
+    """Free a fully parsed element's contents while streaming an XML file.
+
+    With lxml, the already processed siblings before it are removed from the
+    parent as well, so the partial tree does not keep growing.
+    """
+    elem.clear()
+    # The root element has no parent, only top-level comments/PIs before it
+    if hasattr(elem, 'getprevious') and elem.getparent() is not None:
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+@lru_cache(maxsize=2048)
+def _parse_xml_file_cached(xml_file_path, mtime_ns, size):
+    # mtime_ns and size are only part of the cache key
     metadata = {}
     try:
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot()
-        series_info = root.find('.//Series_Info')
-        if series_info is not None:
-            for attr in series_info.findall('.//Attribute'):
-                name = attr.get('Name', '')
-                value = attr.text
-                if name and value:
-                    metadata[name] = value
-        image_info = root.find('.//Image_Info')
-        if image_info is not None:
-            for attr in image_info.findall('.//Attribute'):
-                name = attr.get('Name', '')
-                value = attr.text
-                if name and value:
-                    metadata[f"Image_{name}"] = value
+        # Stream the file rather than building the whole tree: only the
+        # attributes of the first Series_Info and the first Image_Info block
+        # are needed, so parsing stops once both have been read
+        section = None
+        done = set()
+        with open(xml_file_path, 'rb') as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end'), **XML_PARSE_OPTIONS):
+                tag = elem.tag
+                if event == 'start':
+                    if section is None and tag in XML_SECTIONS and tag not in done:
+                        section = tag
+                elif section is None:
+                    _release_element(elem)
+                elif tag == 'Attribute':
+                    name = elem.get('Name', '')
+                    value = elem.text
+                    if name and value:
+                        metadata[XML_SECTIONS[section] + name] = value
+                    _release_element(elem)
+                elif tag == section:
+                    done.add(section)
+                    section = None
+                    _release_element(elem)
+                    if len(done) == len(XML_SECTIONS):
+                        break
     except Exception as e:
-        print(f"Warning: Could not parse XML file {xml_file_path}: {e}")
-    return metadata
+        _print(f"Warning: Could not parse XML file {xml_file_path}: {e}")
+    # Read-only, as the same dict is handed to every caller
+    return MappingProxyType(metadata)
 
 def extract_scan_info_from_filename(filename):
-    match = re.match(r'(.+?)_(\d+)_(\d+)_(\d+)_(\d+\.\d+\.\d+)_\((.+?)\)\.PAR', filename)
+    match = PAR_FILENAME_RE.match(filename)
     if match:
         patient_id, exam_num, series_num, acquisition_num, time, protocol = match.groups()
         return {
@@ -76,92 +280,258 @@ def extract_scan_info_from_filename(filename):
         }
     return {}
 
-def bids_entities(scan_info, t1w_count=None):
-    # Use subject ID from the parent folder name
-    sub = scan_info.get('subject_id', 'unknown')
-    
+@lru_cache(maxsize=256)
+def _classify_protocol(protocol_name):
+    """Return (acq, kind, suffix, modality, task, run) for a protocol name.
+
+    Depends only on the protocol name, so results are cached across PAR files
+    and subjects. T1w run numbers are assigned by the caller.
+    """
     # Clean up acquisition name - remove "wip", "vip" and redundant information
-    acq = scan_info.get('protocol_name', 'acq')
-    acq = re.sub(r'[^a-zA-Z0-9]', '', acq.lower())
+    acq = 'acq' if protocol_name is None else protocol_name
+    acq = NON_ALNUM_RE.sub('', acq.lower())
+    # Underscores and whitespace are already gone with the other non-alphanumerics
     acq = acq.replace('wip', '').replace('vip', '')  # Remove wip/vip
-    acq = acq.replace('_', '').strip()  # Remove underscores and whitespace
     
-    protocol = scan_info.get('protocol_name', '').lower()
+    protocol = '' if protocol_name is None else protocol_name.lower()
     
     # Determine modality and suffix based on protocol
-    if 't1w' in protocol or 't1' in protocol:
-        suffix = 'T1w'
-        modality = 'anat'
+    match = PROTOCOL_RE.match(protocol)
+    kind = match.lastgroup if match else None
+    suffix, modality, task = PROTOCOL_CLASSES[kind][1:] if kind else ('unknown', 'unknown', None)
+    run = protocol.split('anticipation')[-1] if kind == 'anticipation' else None
+    return acq, kind, suffix, modality, task, run
+
+def bids_entities(scan_info, t1w_count=None):
+    # Use subject ID from the parent folder name
+    sub = scan_info.get('subject_id', 'unknown')
+    
+    acq, kind, suffix, modality, task, run = _classify_protocol(scan_info.get('protocol_name'))
+    if kind == 't1' and t1w_count is not None:
         # Add run number for T1w files to distinguish multiple acquisitions
-        if t1w_count is not None:
-            if acq not in t1w_count:
-                t1w_count[acq] = 1
-            else:
-                t1w_count[acq] += 1
-            run = str(t1w_count[acq])
-    elif 't2w' in protocol or 't2' in protocol:
-        suffix = 'T2w'
-        modality = 'anat'
-    elif 'funct' in protocol or 'resting' in protocol:
-        suffix = 'bold'
-        modality = 'func'
-        task = 'rest'
-    elif 'anticipation' in protocol:
-        suffix = 'bold'
-        modality = 'func'
-        task = 'anticipation'
-        run = protocol.split('anticipation')[-1] if 'anticipation' in protocol else '01'
-    elif 'test_epi' in protocol:
-        suffix = 'bold'
-        modality = 'func'
-        task = 'test'
-    elif 'b0map' in protocol:
-        suffix = 'phasediff'
-        modality = 'fmap'
-    elif 'survey' in protocol:
-        suffix = 'scout'
-        modality = 'anat'
-    else:
-        suffix = 'unknown'
-        modality = 'unknown'
+        t1w_count[acq] = t1w_count.get(acq, 0) + 1
+        run = str(t1w_count[acq])
     
     # Build BIDS filename - no session information
     parts = [f"sub-{sub}"]
     
     # Add acquisition label for T1w files to distinguish different acquisitions
-    if modality == 'anat' and 't1' in protocol:
+    if kind == 't1':
         if acq and acq not in ['', 'none']:
             parts.append(f"acq-{acq}")
     
-    if modality == 'func' and 'task' in locals():
+    if task is not None:
         parts.append(f"task-{task}")
-    if 'run' in locals():
+    if run is not None:
         parts.append(f"run-{run}")
     parts.append(suffix)
     return '_'.join(parts), modality
 
-def convert_parrec_to_nifti(par_file, output_dir):
-    par_path = Path(par_file)
-    base_name = par_path.stem
-    output_file = output_dir / f"{base_name}.nii"
-    cmd = [
-        'parrec2nii',
+@lru_cache(maxsize=None)
+def _parrec2nii_opts(output_dir):
+    """Options equivalent to `parrec2nii --overwrite --compressed --store-header`.
+
+    Parsed once per output directory and shared by all of its conversions;
+    proc_file only reads them.
+    """
+    opts, _ = parrec2nii.get_opt_parser().parse_args([
         '--overwrite',
         '--output-dir', str(output_dir),
         '--compressed',
-        '--store-header',
-        str(par_file)
-    ]
+        '--store-header'
+    ])
+    return opts
+
+def convert_parrec_to_nifti(par_file, output_dir):
+    """Convert a PAR/REC file to compressed NIfTI in-process.
+
+    Runs the same code as the parrec2nii command line tool without spawning a
+    new Python interpreter per file. Returns the path of the written .nii.gz
+    file, or None on failure.
+    """
     try:
-        subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return output_file
-    except subprocess.CalledProcessError as e:
-        print(f"Error converting {par_file}: {e}\nstderr: {e.stderr}")
+        parrec2nii.proc_file(str(par_file), _parrec2nii_opts(output_dir))
+    except Exception as e:
+        _print(f"Error converting {par_file}: {e}")
         return None
+    return output_dir / f"{Path(par_file).stem}.nii.gz"
+
+def _init_converter_process(verbose):
+    parrec2nii.verbose.switch = verbose
+
+def _converter_pool(max_workers):
+    """Process pool for PAR/REC conversions."""
+    # The pool is started while the metadata/sidecar threads are running, so
+    # its workers must not be forked from this process: a lock held by one of
+    # those threads (print, stdout, imports) would stay locked in the child
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(CONVERTER_START_METHOD),
+        initializer=_init_converter_process,
+        initargs=(parrec2nii.verbose.switch,)
+    )
+
+def convert_parrec_batch(par_files, output_dir, max_parallel):
+    """Convert PAR files with up to max_parallel conversions running at once.
+
+    Yields (PAR file, output path or None on failure) as each conversion
+    finishes, so callers can start on a file while the rest are converting.
+    """
+    # The conversion is CPU-bound Python/NumPy work, so run it in separate
+    # processes rather than threads to keep the GIL out of the way. This also
+    # means a conversion that crashes or is killed (e.g. out of memory) only
+    # takes its worker process down, not the whole subject
+    retry = []
+    with _converter_pool(max(1, max_parallel)) as pool:
+        futures = {
+            pool.submit(convert_parrec_to_nifti, par_file, output_dir): par_file
+            for par_file in par_files
+        }
+        for future in as_completed(futures):
+            par_file = futures[future]
+            try:
+                nifti_file = future.result()
+            except BrokenProcessPool:
+                # All unfinished conversions fail together when a worker
+                # dies, so it is not known which file was responsible
+                retry.append(par_file)
+                continue
+            except Exception as e:
+                _print(f"Error converting {par_file}: {e}")
+                nifti_file = None
+            yield par_file, nifti_file
+    
+    if retry:
+        _print(f"A conversion process died; retrying {len(retry)} file(s) one at a time")
+        yield from _convert_isolated(retry, output_dir)
 
-def process_subject_directory(subject_dir):
-    """Process a single subject directory."""
+def _convert_isolated(par_files, output_dir):
+    """Convert PAR files one at a time, replacing the worker process if one dies."""
+    pool = None
+    try:
+        for par_file in par_files:
+            if pool is None:
+                pool = _converter_pool(1)
+            try:
+                nifti_file = pool.submit(convert_parrec_to_nifti, par_file, output_dir).result()
+            except BrokenProcessPool:
+                _print(f"Error converting {par_file}: the conversion process died")
+                pool.shutdown()
+                pool = None
+                nifti_file = None
+            except Exception as e:
+                _print(f"Error converting {par_file}: {e}")
+                nifti_file = None
+            yield par_file, nifti_file
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def _read_metadata(par_file, xml_file):
+    """Read the PAR header and XML metadata (xml_file may be None) for a PAR file."""
+    par_metadata = extract_par_metadata(par_file)
+    xml_metadata = parse_xml_file(xml_file) if xml_file is not None else {}
+    return par_metadata, xml_metadata
+
+def _process_one_par(par_file, scan_info, bids_base, modality, par_metadata, xml_metadata,
+                     nifti_file, nifti_bids_dir, conversion_date):
+    """Rename a converted PAR file to its BIDS name and write the JSON sidecar.
+
+    nifti_file is the converted NIfTI, or None if the conversion failed.
+    Returns 'converted' or 'failed'.
+    """
+    subject_id = scan_info['subject_id']
+    _print(f"\nProcessing: {par_file.name}")
+    
+    # Rename to BIDS - a single atomic os.replace(), which also tells us
+    # whether the conversion actually produced its output file
+    bids_nifti = nifti_bids_dir / f"{bids_base}.nii.gz"
+    if nifti_file is not None:
+        try:
+            os.replace(nifti_file, bids_nifti)
+        except FileNotFoundError:
+            nifti_file = None
+    if nifti_file is None:
+        _print(f"Failed to convert {par_file.name}")
+        return 'failed'
+
+    # Special handling for fieldmaps: the converted file contains the phase
+    # difference, extract magnitude data from it if available
+    if modality == 'fmap':
+        extract_fieldmap_data(par_file, bids_nifti, nifti_bids_dir, subject_id,
+                              scan_info['source_files'], par_metadata, xml_metadata,
+                              conversion_date)
+    
+    # JSON sidecar
+    json_data = {
+        "ConversionSoftware": "convert_parrec_to_nifti_bids.py",
+        "ConversionSoftwareVersion": "2.0",
+        "ConversionDate": conversion_date,
+        "SourceFormat": "Philips PAR/REC",
+        "SourceFiles": scan_info['source_files'],
+        "BIDSModality": modality,
+        "SubjectID": subject_id,
+        **par_metadata,
+        "XMLMetadata": dict(xml_metadata)
+    }
+    
+    # Add BIDS-specific fields for fMRI runs
+    if modality == 'func' and 'SliceTiming' in par_metadata:
+        json_data.update({
+            "SliceEncodingDirection": "k",
+            "PhaseEncodingDirection": "j-",
+            "EffectiveEchoSpacing": 0.00051,  # Default for EPI, can be calculated from PAR if available
+            "EchoTrainLength": 1
+        })
+    
+    # Add BIDS-specific fields for fieldmaps
+    if modality == 'fmap':
+        json_data.update({
+            "Units": "Hz",
+            "IntendedFor": []  # Will be populated by fMRIPrep
+        })
+    
+    json_file = bids_nifti.with_suffix('.json')
+    json_file.write_bytes(_dumps(json_data))
+    _print(f"BIDS conversion complete: {bids_nifti.name} + {json_file.name}")
+    return 'converted'
+
+def _is_up_to_date(par_file, *bids_niftis):
+    """Whether every BIDS NIfTI and its JSON sidecar exist and are no older than par_file."""
+    try:
+        # Nanosecond mtimes, so a PAR file modified within the same second as
+        # the previous conversion is still picked up
+        par_mtime = par_file.stat().st_mtime_ns
+        return all(
+            bids_nifti.stat().st_mtime_ns >= par_mtime and bids_nifti.with_suffix('.json').exists()
+            for bids_nifti in bids_niftis
+        )
+    except FileNotFoundError:
+        return False
+
+def _magnitude_path(output_dir, subject_id):
+    """Path of the magnitude image extracted from a subject's B0 map."""
+    return output_dir / f"sub-{subject_id}_magnitude1.nii.gz"
+
+def process_subject_directory(subject_dir, conversion_date=None, force=False,
+                              verbose=False, par_workers=MAX_PAR_WORKERS):
+    """Process a single subject directory.
+
+    conversion_date is the ConversionDate written to every sidecar (default:
+    now). PAR files whose BIDS NIfTI and JSON sidecar are already newer than
+    the PAR file are skipped, unless force is set. verbose turns on the
+    progress output of the PAR/REC converter. par_workers is the number of
+    PAR files converted at once.
+    """
+    # Set here rather than only in main() so it also applies in the worker
+    # processes, which do not necessarily inherit the parent's module state
+    parrec2nii.verbose.switch = verbose
+    if conversion_date is None:
+        conversion_date = datetime.now().isoformat()
     subject_id = subject_dir.name
+    print(f"\n{'='*50}")
+    print(f"Processing subject: {subject_id}")
+    print(f"{'='*50}")
     xmlparrec_dir = subject_dir / "XMLPARREC"
     nifti_bids_dir = subject_dir / "NIfTI_BIDS"
     
@@ -172,8 +542,18 @@ def process_subject_directory(subject_dir):
     # Create output directory
     nifti_bids_dir.mkdir(exist_ok=True)
     
-    # Find all PAR files
-    par_files = list(xmlparrec_dir.glob("*.PAR"))
+    # List the input directory once; PAR files and their siblings are looked
+    # up in this listing instead of with a stat() call per file
+    with os.scandir(xmlparrec_dir) as it:
+        entries = list(it)
+    entry_names = {entry.name for entry in entries}
+    
+    # Find all PAR files; DirEntry caches the file type, so checking that
+    # they are regular files costs no extra stat() calls
+    par_files = [
+        xmlparrec_dir / entry.name for entry in entries
+        if entry.name.endswith('.PAR') and not entry.name.startswith('.') and entry.is_file()
+    ]
     
     if not par_files:
         print(f"No PAR files found in {xmlparrec_dir}")
@@ -184,10 +564,10 @@ def process_subject_directory(subject_dir):
     # Track T1w files to assign run numbers
     t1w_count = {}
     
-    # Process each PAR file
+    # Work out the BIDS names serially, in PAR file order, so that T1w run
+    # numbers do not depend on the order in which conversions finish
+    planned = {}
     for par_file in par_files:
-        print(f"\nProcessing: {par_file.name}")
-        
         # Skip survey/coil files that cause conversion errors
         if 'survey' in par_file.name.lower() or 'coil' in par_file.name.lower():
             print(f"Skipping survey/coil file: {par_file.name}")
@@ -196,217 +576,192 @@ def process_subject_directory(subject_dir):
         # Extract scan information
         scan_info = extract_scan_info_from_filename(par_file.name)
         scan_info['subject_id'] = subject_id  # Add subject ID from parent folder
-        scan_info['source_files'] = [
-            str(par_file),
-            str(par_file.with_suffix('.REC')),
-            str(par_file.with_suffix('.XML')),
-            str(par_file.with_suffix('.V41'))
-        ]
+        rec_file, xml_file, v41_file = (par_file.with_suffix(ext) for ext in ('.REC', '.XML', '.V41'))
+        scan_info['source_files'] = [str(par_file), str(rec_file), str(xml_file), str(v41_file)]
         
         bids_base, modality = bids_entities(scan_info, t1w_count)
-        par_metadata = extract_par_metadata(par_file)
-        xml_file = par_file.with_suffix('.XML')
-        xml_metadata = parse_xml_file(xml_file) if xml_file.exists() else {}
         
-        # Special handling for fieldmaps
+        # Several PAR files can map to the same BIDS name (repeated rest runs,
+        # or B0 maps, which also share the magnitude file). Converting them
+        # concurrently would race on the same outputs, so only the last one is
+        # kept, as it was when files were converted one after another
+        if bids_base in planned:
+            print(f"Warning: {planned[bids_base][0].name} and {par_file.name} both map to "
+                  f"{bids_base}; keeping {par_file.name}")
+            del planned[bids_base]
+        planned[bids_base] = (par_file, scan_info, modality, xml_file)
+    
+    tasks = []
+    skipped = 0
+    for bids_base, (par_file, scan_info, modality, xml_file) in planned.items():
+        # Skip files converted by a previous run
+        bids_nifti = nifti_bids_dir / f"{bids_base}.nii.gz"
+        # A B0 map is only done once its magnitude image has been written too
+        outputs = [bids_nifti]
         if modality == 'fmap':
-            # Extract magnitude data if available
-            magnitude_file = extract_fieldmap_data(par_file, nifti_bids_dir, subject_id)
-            # Convert the full fieldmap (will contain phase difference)
-            nifti_file = convert_parrec_to_nifti(par_file, nifti_bids_dir)
-        else:
-            nifti_file = convert_parrec_to_nifti(par_file, nifti_bids_dir)
+            outputs.append(_magnitude_path(nifti_bids_dir, subject_id))
+        if not force and _is_up_to_date(par_file, *outputs):
+            print(f"Skip (up-to-date): {bids_base}")
+            skipped += 1
+            continue
         
-        actual_nifti_file = None
-        if nifti_file and nifti_file.exists():
-            actual_nifti_file = nifti_file
-        else:
-            gz_file = Path(str(nifti_file) + '.gz')
-            if gz_file.exists():
-                actual_nifti_file = gz_file
+        if xml_file.name not in entry_names:
+            xml_file = None
+        tasks.append((par_file, scan_info, bids_base, modality, xml_file))
+    
+    if not tasks:
+        print(f"\nSubject {subject_id}: all {skipped} file(s) up-to-date")
+        return
+    
+    max_workers = min(len(tasks), MAX_PAR_WORKERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Queue all the PAR/XML reads up front so they overlap with the
+        # conversions instead of starting after them
+        metadata_futures = [
+            pool.submit(_read_metadata, par_file, xml_file)
+            for par_file, _, _, _, xml_file in tasks
+        ]
         
-        if actual_nifti_file and actual_nifti_file.exists():
-            # Rename to BIDS
-            # Always use .nii.gz for compressed NIfTI
-            bids_nifti = nifti_bids_dir / f"{bids_base}.nii.gz"
-            actual_nifti_file.rename(bids_nifti)
-            
-            # JSON sidecar
-            json_data = {
-                "ConversionSoftware": "convert_parrec_to_nifti_bids.py",
-                "ConversionSoftwareVersion": "2.0",
-                "ConversionDate": datetime.now().isoformat(),
-                "SourceFormat": "Philips PAR/REC",
-                "SourceFiles": scan_info['source_files'],
-                "BIDSModality": modality,
-                "SubjectID": subject_id,
-                **par_metadata,
-                "XMLMetadata": xml_metadata
-            }
-            
-            # Add BIDS-specific fields for fMRI runs
-            if modality == 'func' and 'SliceTiming' in par_metadata:
-                json_data.update({
-                    "SliceEncodingDirection": "k",
-                    "PhaseEncodingDirection": "j-",
-                    "EffectiveEchoSpacing": 0.00051,  # Default for EPI, can be calculated from PAR if available
-                    "EchoTrainLength": 1
-                })
-            
-            # Add BIDS-specific fields for fieldmaps
-            if modality == 'fmap':
-                json_data.update({
-                    "Units": "Hz",
-                    "IntendedFor": []  # Will be populated by fMRIPrep
-                })
-            
-            json_file = bids_nifti.with_suffix('.json')
-            with open(json_file, 'w') as f:
-                json.dump(json_data, f, indent=2)
-            print(f"BIDS conversion complete: {bids_nifti.name} + {json_file.name}")
-        else:
-            print(f"Failed to convert {par_file.name}")
+        pending = {task[0]: (task, metadata) for task, metadata in zip(tasks, metadata_futures)}
+        
+        # Run all PAR/REC conversions for the subject as one batch, renaming
+        # and writing the JSON sidecar for each file as soon as its conversion
+        # is done, while the others are still running
+        futures = []
+        for par_file, nifti_file in convert_parrec_batch(list(pending), nifti_bids_dir,
+                                                         min(len(tasks), par_workers)):
+            (_, scan_info, bids_base, modality, _), metadata = pending[par_file]
+            futures.append(pool.submit(_process_one_par, par_file, scan_info, bids_base,
+                                       modality, *metadata.result(), nifti_file,
+                                       nifti_bids_dir, conversion_date))
+        results = [future.result() for future in futures]
+    
+    print(f"\nSubject {subject_id}: {results.count('converted')} converted, "
+          f"{results.count('failed')} failed, {skipped} up-to-date")
 
 def extract_par_metadata(par_file):
     """Extract metadata from PAR file header"""
+    return _parse_par_full(par_file)[0]
+
+def _parse_par_full(par_file):
+    """Parse a PAR file's header and image table in one pass.
+
+    Returns (header metadata, number of magnitude images, number of phase
+    difference images), reusing the result while the file is unchanged.
+    """
+    st = os.stat(par_file)
+    return _parse_par_full_cached(str(par_file), st.st_mtime_ns, st.st_size)
+
+@lru_cache(maxsize=2048)
+def _parse_par_full_cached(par_file, mtime_ns, size):
+    # mtime_ns and size are only part of the cache key
     metadata = {}
+    n_magnitude = 0
+    n_phase = 0
     
-    with open(par_file, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-    
-    # Extract basic parameters
-    tr_match = re.search(r'Repetition time \[ms\]\s*:\s*([\d.]+)', content)
-    if tr_match:
-        metadata['RepetitionTime'] = float(tr_match.group(1)) / 1000.0  # Convert to seconds
-    
-    te_match = re.search(r'Echo time \[ms\]\s*:\s*([\d.]+)', content)
-    if te_match:
-        metadata['EchoTime'] = float(te_match.group(1)) / 1000.0  # Convert to seconds
-    
-    slices_match = re.search(r'Max\. number of slices/locations\s*:\s*(\d+)', content)
-    if slices_match:
-        metadata['NumberOfSlices'] = int(slices_match.group(1))
-    
-    dynamics_match = re.search(r'Max\. number of dynamics\s*:\s*(\d+)', content)
-    if dynamics_match:
-        metadata['NumberOfDynamics'] = int(dynamics_match.group(1))
-    
-    fov_match = re.search(r'FOV \(ap,fh,rl\) \[mm\]\s*:\s*([\d.]+)\s+([\d.]+)\s+([\d.]+)', content)
-    if fov_match:
-        metadata['FieldOfView'] = [float(fov_match.group(1)), float(fov_match.group(2)), float(fov_match.group(3))]
-    
-    resolution_match = re.search(r'Scan resolution\s*\(x, y\)\s*:\s*(\d+)\s+(\d+)', content)
-    if resolution_match:
-        metadata['ScanResolution'] = [int(resolution_match.group(1)), int(resolution_match.group(2))]
+    # Single streaming pass: header parameters until the image table starts,
+    # then count the image table rows that are magnitude and phase difference
+    # images (only the counts are kept, so cached results stay small)
+    remaining = dict(PAR_HEADER_FIELDS)
+    in_image_section = False
+    with open(par_file, 'rb', buffering=65536) as f:
+        for line in f:
+            if in_image_section:
+                if line.startswith(b'# === END OF DATA DESCRIPTION FILE'):
+                    break
+                # Skip blank lines and the column header comments
+                if line.startswith(b'#') or not line.strip():
+                    continue
+                parts = line.split(None, 5)
+                if len(parts) >= 5:
+                    try:
+                        image_type = int(parts[4])  # 5th column is image_type_mr
+                    except ValueError:
+                        # A malformed row is neither a magnitude nor a phase image
+                        image_type = None
+                    if image_type == 0:  # Magnitude (Philips uses 0 for magnitude)
+                        n_magnitude += 1
+                    elif image_type == 18:  # Phase difference
+                        n_phase += 1
+            # The general information section ends where the image table starts
+            elif line.startswith(b'# === IMAGE INFORMATION'):
+                in_image_section = True
+            # Parameter lines start with '.'; skip comments and blank lines
+            # without trying every marker on them
+            elif remaining and line.startswith(b'.'):
+                for marker, (key, pattern, convert) in remaining.items():
+                    if marker in line:
+                        match = pattern.search(line)
+                        if match:
+                            metadata[key] = convert(match)
+                            del remaining[marker]
+                        break
     
     # Extract slice timing for fMRI runs
     if metadata.get('NumberOfSlices') and metadata.get('RepetitionTime'):
         # Calculate slice timing for EPI sequences
         # For EPI, slice timing = (slice_number - 1) * (TR / number_of_slices)
-        slice_timing = []
-        for i in range(1, metadata['NumberOfSlices'] + 1):
-            timing = (i - 1) * (metadata['RepetitionTime'] / metadata['NumberOfSlices'])
-            slice_timing.append(timing)
-        metadata['SliceTiming'] = slice_timing
-    
-    return metadata
-
-def extract_fieldmap_data(par_file, output_dir, subject_id):
-    """Extract magnitude and phase difference data from fieldmap PAR file using nibabel."""
-    par_path = Path(par_file)
-    base_name = par_path.stem
-    
-    # Read PAR file to understand structure
-    with open(par_file, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-    
-    # Find the image information section
-    lines = content.split('\n')
-    image_lines = []
-    in_image_section = False
+        n_slices = metadata['NumberOfSlices']
+        slice_timing = np.arange(n_slices) * (metadata['RepetitionTime'] / n_slices)
+        metadata['SliceTiming'] = slice_timing.tolist()
     
-    for line in lines:
-        if '# === IMAGE INFORMATION ==========================================================' in line:
-            in_image_section = True
-            continue
-        elif '# === END OF DATA DESCRIPTION FILE' in line:
-            break
-        elif in_image_section and line.strip() and not line.startswith('#'):
-            # Skip header line
-            if 'sl ec  dyn ph ty' not in line:
-                image_lines.append(line.strip())
-    
-    # Parse image lines to separate magnitude and phase data
-    magnitude_indices = []
-    phase_indices = []
-    
-    for i, line in enumerate(image_lines):
-        parts = line.split()
-        if len(parts) >= 5:
-            image_type = int(parts[4])  # 5th column is image_type_mr
-            if image_type == 0:  # Magnitude (Philips uses 0 for magnitude)
-                magnitude_indices.append(i)
-            elif image_type == 18:  # Phase difference
-                phase_indices.append(i)
-    
-    print(f"Found {len(magnitude_indices)} magnitude images and {len(phase_indices)} phase difference images")
-    
-    # Convert full PAR/REC to NIfTI
-    cmd = [
-        'parrec2nii',
-        '--overwrite',
-        '--output-dir', str(output_dir),
-        '--compressed',
-        '--store-header',
-        str(par_file)
-    ]
-    try:
-        subprocess.run(cmd, capture_output=True, text=True, check=True)
-        full_nii = output_dir / f"{base_name}.nii.gz"
-        bids_magnitude = output_dir / f"sub-{subject_id}_magnitude1.nii.gz"
-        if full_nii.exists() and len(magnitude_indices) > 0:
-            # Use nibabel to extract the first N volumes (magnitude images)
-            img = nib.load(str(full_nii))
-            data = img.get_fdata()
-            # If 4D, select first N volumes; if 3D, just copy
-            if data.ndim == 4:
-                mag_data = data[..., :len(magnitude_indices)]
-            else:
-                mag_data = data
-            mag_img = nib.Nifti1Image(mag_data, img.affine, img.header)
-            nib.save(mag_img, str(bids_magnitude))
-            print(f"Created magnitude fieldmap: {bids_magnitude.name}")
-            # Optionally remove the intermediate file
-            # full_nii.unlink()
-            # Create JSON for magnitude
-            magnitude_json = {
-                "ConversionSoftware": "convert_parrec_to_nifti_bids.py",
-                "ConversionSoftwareVersion": "2.0",
-                "ConversionDate": datetime.now().isoformat(),
-                "SourceFormat": "Philips PAR/REC",
-                "SourceFiles": [
-                    str(par_file),
-                    str(par_file.with_suffix('.REC')),
-                    str(par_file.with_suffix('.XML')),
-                    str(par_file.with_suffix('.V41'))
-                ],
-                "BIDSModality": "fmap",
-                "SubjectID": subject_id,
-                "Units": "Hz",
-                "IntendedFor": []  # Will be populated later
-            }
-            par_metadata = extract_par_metadata(par_file)
-            magnitude_json.update(par_metadata)
-            xml_file = par_file.with_suffix('.XML')
-            xml_metadata = parse_xml_file(xml_file) if xml_file.exists() else {}
-            magnitude_json["XMLMetadata"] = xml_metadata
-            with open(bids_magnitude.with_suffix('.json'), 'w') as f:
-                json.dump(magnitude_json, f, indent=2)
-            return bids_magnitude
-    except subprocess.CalledProcessError as e:
-        print(f"Error extracting magnitude image: {e}\nstderr: {e.stderr}")
+    # Read-only, as the same result is handed to every caller
+    return MappingProxyType(metadata), n_magnitude, n_phase
+
+def extract_fieldmap_data(par_file, full_nii, output_dir, subject_id, source_files,
+                          par_metadata, xml_metadata, conversion_date):
+    """Extract magnitude data from a converted fieldmap NIfTI using nibabel.
+
+    full_nii is the converted NIfTI for par_file, which holds both the
+    magnitude and phase difference images. par_metadata and xml_metadata are
+    the already parsed PAR header and XML metadata for par_file.
+    """
+    # The image table was parsed together with the header metadata
+    _, n_magnitude, n_phase = _parse_par_full(par_file)
+    
+    _print(f"Found {n_magnitude} magnitude images and {n_phase} phase difference images")
+    
+    # The full PAR/REC has already been converted to NIfTI by the caller
+    bids_magnitude = _magnitude_path(output_dir, subject_id)
+    if full_nii.exists() and n_magnitude > 0:
+        # Use nibabel to extract the first N volumes (magnitude images); the
+        # slicer only reads those volumes, in their stored data type
+        img = nib.load(str(full_nii))
+        # If 4D, select first N volumes; if 3D, just copy
+        if img.ndim == 4:
+            mag_img = img.slicer[..., :n_magnitude]
+        else:
+            mag_img = img
+        nib.save(mag_img, str(bids_magnitude))
+        _print(f"Created magnitude fieldmap: {bids_magnitude.name}")
+        # Create JSON for magnitude
+        magnitude_json = {
+            "ConversionSoftware": "convert_parrec_to_nifti_bids.py",
+            "ConversionSoftwareVersion": "2.0",
+            "ConversionDate": conversion_date,
+            "SourceFormat": "Philips PAR/REC",
+            "SourceFiles": source_files,
+            "BIDSModality": "fmap",
+            "SubjectID": subject_id,
+            "Units": "Hz",
+            "IntendedFor": []  # Will be populated later
+        }
+        magnitude_json.update(par_metadata)
+        magnitude_json["XMLMetadata"] = dict(xml_metadata)
+        bids_magnitude.with_suffix('.json').write_bytes(_dumps(magnitude_json))
+        return bids_magnitude
     return None
 
+def _positive_int(value):
+    """argparse type for options that must be at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got '{value}'")
+    return number
+
 def main():
     """Main conversion function."""
     parser = argparse.ArgumentParser(
@@ -417,6 +772,8 @@ Examples:
   %(prog)s                    # Convert all subjects
   %(prog)s VA003             # Convert specific subject
   %(prog)s VA003 VA004       # Convert multiple subjects
+  %(prog)s --jobs 4          # Convert 4 subjects at a time
+  %(prog)s --force           # Reconvert up-to-date files too
         """
     )
     parser.add_argument(
@@ -434,6 +791,17 @@ Examples:
         action='store_true', 
         help='Verbose output'
     )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=_positive_int,
+        default=None,
+        help='Number of subjects to convert in parallel (default: one per subject, up to the CPU count)'
+    )
+    parser.add_argument(
+        '--force', '-f',
+        action='store_true',
+        help='Reconvert files even if their BIDS output is already up-to-date'
+    )
     
     args = parser.parse_args()
     
@@ -451,8 +819,10 @@ Examples:
         print("│   └── NIfTI_BIDS/ (will be created)")
         return
     
-    # Find all subject directories
-    all_subject_dirs = [d for d in data_dir.iterdir() if d.is_dir()]
+    # Find all subject directories; scandir entries carry their file type, so
+    # this doesn't need a stat() per entry
+    with os.scandir(data_dir) as it:
+        all_subject_dirs = [Path(entry.path) for entry in it if entry.is_dir()]
     
     if not all_subject_dirs:
         print(f"No subject directories found in {data_dir}/")
@@ -482,12 +852,21 @@ Examples:
     for subject_dir in subject_dirs:
         print(f"  - {subject_dir.name}")
     
-    # Process each subject
-    for subject_dir in subject_dirs:
-        print(f"\n{'='*50}")
-        print(f"Processing subject: {subject_dir.name}")
-        print(f"{'='*50}")
-        process_subject_directory(subject_dir)
+    # Process subjects in parallel - each one has its own input and output
+    # directories, so they can be converted independently
+    jobs = args.jobs or min(len(subject_dirs), os.cpu_count() or 1)
+    # Share the CPUs between the subjects being converted at the same time
+    par_workers = max(1, (os.cpu_count() or 1) // jobs)
+    # All sidecars written by one run share the same conversion date
+    process = partial(process_subject_directory,
+                      conversion_date=datetime.now().isoformat(), force=args.force,
+                      verbose=args.verbose, par_workers=par_workers)
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(process, subject_dirs))
+    else:
+        for subject_dir in subject_dirs:
+            process(subject_dir)
     
     print(f"\nBIDS conversion complete for {len(subject_dirs)} subject(s)!")
 